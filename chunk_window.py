@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Date-Window Extraction for Emolog chunks
+Streams the entries of a date range out of a chunk directory, opening only the chunks that overlap it
+
+Usage:
+    python chunk_window.py <chunk_dir> [--since <YYYY-MM-DD>] [--until <YYYY-MM-DD>] [--last-days <n>] [--output <file>]
+
+Example:
+    python chunk_window.py chunks/sample01 --since 2025-05-01 --until 2025-05-14
+    python chunk_window.py chunks/sample01 --last-days 14 --output context.jsonl
+"""
+
+import argparse
+import json
+import sys
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterator
+
+from dialogue_chunker import MANIFEST_FILENAME, DATE_INDEX_FILENAME, load_chunk_entries
+
+
+def load_manifest(chunk_dir: str) -> List[Dict[str, Any]]:
+    """Load the per-chunk date manifest written by the chunker"""
+    manifest_path = Path(chunk_dir) / MANIFEST_FILENAME
+    if not manifest_path.exists():
+        raise FileNotFoundError(f"Manifest not found (re-run dialogue_chunker.py): {manifest_path}")
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)["chunks"]
+
+
+def load_date_index(chunk_dir: str) -> List[List[Any]]:
+    """Load the sorted per-entry date index ([date, chunk_number, position] rows)"""
+    index_path = Path(chunk_dir) / DATE_INDEX_FILENAME
+    if not index_path.exists():
+        raise FileNotFoundError(f"Date index not found (re-run dialogue_chunker.py): {index_path}")
+    with open(index_path, 'r', encoding='utf-8') as f:
+        return json.load(f)["entries"]
+
+
+def iter_window_entries(chunk_dir: str, since: Optional[str] = None,
+                        until: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield entries whose metadata.date falls within [since, until] (inclusive, "YYYY-MM-DD").
+
+    Matching positions are looked up in the date index, so only chunks that
+    hold matching entries are opened, one at a time, in chunk order. Entries
+    without a (valid) date are never yielded.
+    """
+    chunk_files = {record["chunk_number"]: record["file"] for record in load_manifest(chunk_dir)}
+    index = load_date_index(chunk_dir)
+
+    # Bisect on the date column: rows sort by date first
+    lo = bisect_left(index, [since]) if since is not None else 0
+    hi = bisect_right(index, [until, float("inf")]) if until is not None else len(index)
+
+    positions: Dict[int, List[int]] = {}
+    for _, chunk_number, position in index[lo:hi]:
+        positions.setdefault(chunk_number, []).append(position)
+
+    for chunk_number in sorted(positions):
+        chunk_file = Path(chunk_dir) / chunk_files[chunk_number]
+        yield from load_chunk_entries(str(chunk_file), sorted(positions[chunk_number]))
+
+
+def _positive_int(value: str) -> int:
+    """argparse type: integer >= 1"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1: {value}")
+    return number
+
+
+def _parse_day(value: str) -> str:
+    """argparse type: validate a YYYY-MM-DD date"""
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date (expected YYYY-MM-DD): {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Extract the entries of a date window from a chunk directory"
+    )
+    parser.add_argument(
+        "chunk_dir",
+        help="Chunk directory for one dialogue (e.g. chunks/sample01)"
+    )
+    parser.add_argument(
+        "--since",
+        type=_parse_day,
+        help="First day to include (YYYY-MM-DD)"
+    )
+    parser.add_argument(
+        "--until",
+        type=_parse_day,
+        help="Last day to include (YYYY-MM-DD)"
+    )
+    parser.add_argument(
+        "--last-days",
+        type=_positive_int,
+        help="Window of N days ending at the latest date in the manifest (overrides --since/--until)"
+    )
+    parser.add_argument(
+        "--output",
+        help="Write JSON lines to this file instead of stdout"
+    )
+
+    args = parser.parse_args()
+    if args.last_days is None and args.since and args.until and args.since > args.until:
+        parser.error(f"--since {args.since} is later than --until {args.until}")
+
+    try:
+        since, until = args.since, args.until
+        if args.last_days is not None:
+            dates = [r["date_max"] for r in load_manifest(args.chunk_dir) if r["date_max"] is not None]
+            if not dates:
+                raise ValueError("No dated entries in this chunk directory")
+            until = max(dates)
+            since = (date.fromisoformat(until) - timedelta(days=args.last_days - 1)).isoformat()
+
+        out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+        count = 0
+        try:
+            for entry in iter_window_entries(args.chunk_dir, since, until):
+                out.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                count += 1
+        finally:
+            if args.output:
+                out.close()
+
+        print(f"Extracted {count:,} entries ({since or 'start'} .. {until or 'end'})", file=sys.stderr)
+
+    except Exception as e:
+        print(f"Error during extraction: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
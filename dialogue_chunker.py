@@ -4,42 +4,290 @@ Dialogue Chunker for Emolog
 Memory-efficient chunking of large dialogue log JSON files into manageable pieces
 
 Usage:
-    python dialogue_chunker.py <input_json_file> [--chunk-size <characters>] [--output-dir <directory>]
+    python dialogue_chunker.py <input_json_file> [--chunk-size <characters>] [--output-dir <directory>] [--dedup]
+                               [--carry-over-size <characters>]
     
 Example:
     python dialogue_chunker.py dialogue_logs/sample01.json --chunk-size 10000 --output-dir chunks/
+    python dialogue_chunker.py dialogue_logs/export_0602.json --dedup
 """
 
+import hashlib
 import json
 import os
 import sys
 import argparse
+from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 # import ijson  # For streaming JSON processing (use when handling very large files)
 
 
+ENTRY_STORE_DIRNAME = "_entry_store"  # Shared content-addressed store under the output directory
+ENTRY_STORE_INDEX = "index.jsonl"  # key -> latest stored version and where it was first chunked
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024  # Start a new store segment beyond this size
+MANIFEST_FILENAME = "manifest.json"  # Per-chunk date ranges
+DATE_INDEX_FILENAME = "date_index.json"  # Per-entry dates, sorted
+
+
+def _normalize_for_hash(value: Any) -> Any:
+    """Collapse whitespace in strings so re-exports with cosmetic differences hash equally"""
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return {k: _normalize_for_hash(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_normalize_for_hash(v) for v in value]
+    return value
+
+
+def _canonical_json(entry: Any) -> str:
+    return json.dumps(_normalize_for_hash(entry), ensure_ascii=False,
+                      sort_keys=True, separators=(",", ":"))
+
+
+def entry_key(entry: Any) -> str:
+    """
+    Content address of a dialogue entry.
+
+    Uses metadata.id when present, otherwise the normalized entry content.
+
+    Returns:
+        str: sha256 hex digest
+    """
+    metadata = entry.get("metadata") if isinstance(entry, dict) else None
+    if isinstance(metadata, dict) and metadata.get("id") not in (None, ""):
+        basis = f"id:{metadata['id']}"
+    else:
+        basis = f"content:{_canonical_json(entry)}"
+    return hashlib.sha256(basis.encode("utf-8")).hexdigest()
+
+
+def entry_digest(entry: Any) -> str:
+    """sha256 hex digest of the normalized entry content (detects edits under the same id)"""
+    return hashlib.sha256(_canonical_json(entry).encode("utf-8")).hexdigest()
+
+
+def read_entry_refs(store_dir: Path, refs: List[List[int]]) -> List[Dict[str, Any]]:
+    """
+    Read entries from the entry store by [segment, offset, length] refs.
+
+    Each segment is opened once, however many refs point into it.
+    """
+    handles = {}
+    entries = []
+    try:
+        for segment, offset, length in refs:
+            f = handles.get(segment)
+            if f is None:
+                f = handles[segment] = open(EntryStore.segment_path(store_dir, segment), 'rb')
+            f.seek(offset)
+            entries.append(json.loads(f.read(length).decode("utf-8")))
+    finally:
+        for f in handles.values():
+            f.close()
+    return entries
+
+
+class EntryStore:
+    """
+    Append-only packed store of dialogue entries, shared across input files.
+
+    Entries are appended as JSON lines to segment_NNNN.jsonl files and
+    index.jsonl maps each key to [digest, segment, offset, length, stem,
+    chunk_number, position] of its latest version (later lines win); the last
+    three give the chunk the version was first stored from. Chunks keep
+    [segment, offset, length] refs, so older chunks still resolve to the
+    version they were built from.
+
+    Statuses are relative to earlier runs: call begin_run() before each input
+    file, and entries stored during the current run stay "new" (or "updated")
+    when they repeat within it.
+    """
+
+    def __init__(self, store_dir: Path):
+        self.store_dir = Path(store_dir)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self.index: Dict[str, List[Any]] = {}
+
+        index_path = self.store_dir / ENTRY_STORE_INDEX
+        if index_path.exists():
+            with open(index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    key, *record = json.loads(line)
+                    self.index[key] = record
+
+        segments = sorted(self.store_dir.glob("segment_*.jsonl"))
+        self.segment = int(segments[-1].stem.split("_")[1]) if segments else 1
+        self._segment_file = None
+        self._index_file = None
+        self._run_status: Dict[str, str] = {}  # key -> status of versions stored during the current run
+
+    def begin_run(self):
+        """Start a new run (input file); later repeats of its entries are "seen" again"""
+        self._run_status = {}
+
+    @staticmethod
+    def segment_path(store_dir: Path, segment: int) -> Path:
+        return Path(store_dir) / f"segment_{segment:04d}.jsonl"
+
+    def put(self, entry: Dict[str, Any], origin: List[Any]) -> Tuple[List[int], str, Optional[List[Any]]]:
+        """
+        Add an entry unless an identical version is already stored.
+
+        Args:
+            entry: Dialogue entry
+            origin: [stem, chunk_number, position] of the chunk being written
+
+        Returns:
+            (ref, status, origin): ref is [segment, offset, length]; origin is
+            where the stored version was first chunked (None for versions stored
+            before origins were recorded); status is "new",
+            "seen" (identical version stored by an earlier run) or "updated"
+            (same key, changed content). Repeats of a version stored during the
+            current run keep the status it was stored with.
+        """
+        key = entry_key(entry)
+        digest = entry_digest(entry)
+        record = self.index.get(key)
+        if record is not None and record[0] == digest:
+            return record[1:4], self._run_status.get(key, "seen"), record[4:] or None
+
+        ref = self._append(entry)
+        self.index[key] = [digest, *ref, *origin]
+        self._index_file.write(json.dumps([key, digest, *ref, *origin], ensure_ascii=False) + "\n")
+        self._run_status[key] = "new" if record is None else "updated"
+        return ref, self._run_status[key], list(origin)
+
+    def _append(self, entry: Dict[str, Any]) -> List[int]:
+        if self._segment_file is None:
+            path = self.segment_path(self.store_dir, self.segment)
+            if path.exists() and path.stat().st_size >= SEGMENT_MAX_BYTES:
+                self.segment += 1
+            self._open_segment()
+            self._index_file = open(self.store_dir / ENTRY_STORE_INDEX, 'a', encoding='utf-8')
+        elif self._segment_file.tell() >= SEGMENT_MAX_BYTES:
+            self._segment_file.close()
+            self.segment += 1
+            self._open_segment()
+
+        data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+        offset = self._segment_file.tell()
+        self._segment_file.write(data + b"\n")
+        return [self.segment, offset, len(data)]
+
+    def _open_segment(self):
+        self._segment_file = open(self.segment_path(self.store_dir, self.segment), 'ab')
+        self._segment_file.seek(0, os.SEEK_END)
+
+    def close(self):
+        """Flush and close open segment/index files"""
+        for f in (self._segment_file, self._index_file):
+            if f is not None:
+                f.close()
+        self._segment_file = None
+        self._index_file = None
+
+
+def entry_date(entry: Any) -> Optional[str]:
+    """
+    Day of an entry ("YYYY-MM-DD" from an ISO 8601 metadata.date), or None if absent.
+
+    Raises:
+        ValueError: metadata.date is present but not an ISO 8601 date string
+    """
+    metadata = entry.get("metadata") if isinstance(entry, dict) else None
+    if not isinstance(metadata, dict) or metadata.get("date") in (None, ""):
+        return None
+    value = metadata["date"]
+    if not isinstance(value, str):
+        raise ValueError(f"invalid date: {value!r}")
+    try:
+        return datetime.fromisoformat(value).date().isoformat()
+    except ValueError:
+        if not value.endswith("Z"):
+            raise
+        # Python < 3.11 rejects the "Z" UTC designator
+        return datetime.fromisoformat(value[:-1] + "+00:00").date().isoformat()
+
+
+def entry_speaker(entry: Any) -> Optional[str]:
+    """Speaker of an entry (metadata.role), or None"""
+    metadata = entry.get("metadata") if isinstance(entry, dict) else None
+    if not isinstance(metadata, dict) or not metadata.get("role"):
+        return None
+    return str(metadata["role"])
+
+
+def load_chunk_entries(chunk_file: str, positions: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+    """
+    Load the entries of a chunk file, resolving entry-store references.
+
+    Works for both plain chunks ("entries") and deduplicated chunks ("entry_refs").
+
+    Args:
+        chunk_file: Chunk JSON file path
+        positions: Only load entries at these positions within the chunk (default: all)
+    """
+    chunk_path = Path(chunk_file)
+    with open(chunk_path, 'r', encoding='utf-8') as f:
+        chunk = json.load(f)
+
+    if "entry_refs" not in chunk:
+        entries = chunk.get("entries", [])
+        return entries if positions is None else [entries[i] for i in positions]
+
+    refs = chunk["entry_refs"]
+    if positions is not None:
+        refs = [refs[i] for i in positions]
+    return read_entry_refs(chunk_path.parent / chunk["chunk_metadata"]["entry_store"], refs)
+
+
+def load_carry_over_entries(chunk_file: str) -> List[Dict[str, Any]]:
+    """Trailing entries carried over from the previous chunk, resolving entry-store refs"""
+    chunk_path = Path(chunk_file)
+    with open(chunk_path, 'r', encoding='utf-8') as f:
+        metadata = json.load(f)["chunk_metadata"]
+
+    carry_over = metadata.get("carry_over", {})
+    if "trailing_entry_refs" in carry_over:
+        return read_entry_refs(chunk_path.parent / metadata["entry_store"], carry_over["trailing_entry_refs"])
+    return carry_over.get("trailing_entries", [])
+
+
 class DialogueChunker:
-    def __init__(self, chunk_size: int = 25000, output_dir: str = "chunks"):
+    def __init__(self, chunk_size: int = 25000, output_dir: str = "chunks", dedup: bool = False,
+                 carry_over_size: int = 2000):
         """
         Args:
             chunk_size: Target character count for each chunk (default: 25,000 characters)
             output_dir: Output directory for chunk files
+            dedup: Store entries once in a content-addressed store shared across
+                   input files; chunks then hold references instead of copies
+            carry_over_size: Character budget for trailing entries of the previous
+                             chunk copied into each chunk's carry-over block (default: 2,000)
         """
         self.chunk_size = chunk_size
+        self.carry_over_size = carry_over_size
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
         self.current_subdir = None  # Subdirectory for current file
+        self.dedup = dedup
+        self.entry_store_dir = self.output_dir / ENTRY_STORE_DIRNAME
+        self.entry_store = EntryStore(self.entry_store_dir) if dedup else None
         
     def estimate_entry_size(self, entry: Dict[str, Any]) -> int:
         """Estimate approximate character count of a dialogue entry"""
         return len(json.dumps(entry, ensure_ascii=False))
+
     
     def clear_output_dir(self):
         """Clear existing chunk files in current subdirectory"""
         if self.current_subdir and self.current_subdir.exists():
             for file in self.current_subdir.glob("chunk_*.json"):
                 file.unlink()
+            for name in (MANIFEST_FILENAME, DATE_INDEX_FILENAME):
+                (self.current_subdir / name).unlink(missing_ok=True)
             
     def chunk_dialogue_file(self, input_file: str) -> Dict[str, Any]:
         """
@@ -61,12 +309,25 @@ class DialogueChunker:
         self.current_subdir.mkdir(exist_ok=True)
         
         self.clear_output_dir()
+        if self.entry_store is not None:
+            self.entry_store.begin_run()
             
         chunk_count = 0
         current_chunk = []
+        current_status = []  # Store status per entry ("new" / "seen" / "updated") when deduplicating
+        current_origins = []  # [stem, chunk_number, position] where each entry was first chunked
+        current_entries = []  # (entry, size, store ref or None) of the current chunk, for carry-over
+        current_dates = []
         current_size = 0
+        speaker_counts = {}  # Running entry count per speaker, in order of first appearance
+        carry_over = self._build_carry_over([], speaker_counts, 0, 0)
+        manifest = []  # Per-chunk records (file, entry count, date range)
+        date_index = []  # [date, chunk_number, position] per dated entry
         total_entries = 0
         total_characters = 0
+        invalid_dates = 0  # Entries whose metadata.date could not be parsed (left out of the date index)
+        status_counts = {"new": 0, "seen": 0, "updated": 0}
+        unique_refs = set()  # Unique stored versions within this input file
         
         try:
             # Try normal JSON loading (for smaller files)
@@ -83,18 +344,51 @@ class DialogueChunker:
                 # Start new chunk if current chunk exceeds size limit
                 if current_size + entry_size > self.chunk_size and current_chunk:
                     chunk_count += 1
-                    self._save_chunk(current_chunk, chunk_count)
+                    manifest.append(self._save_chunk(current_chunk, chunk_count, current_dates, carry_over,
+                                                     current_status, current_origins))
+                    carry_over = self._build_carry_over(
+                        current_entries, speaker_counts, total_entries, total_characters - entry_size
+                    )
                     current_chunk = []
+                    current_status = []
+                    current_origins = []
+                    current_entries = []
+                    current_dates = []
                     current_size = 0
                     
-                current_chunk.append(entry)
+                try:
+                    day = entry_date(entry)
+                except ValueError:
+                    day = None
+                    invalid_dates += 1
+                if day is not None:
+                    date_index.append([day, chunk_count + 1, len(current_chunk)])
+                current_dates.append(day)
+                speaker = entry_speaker(entry)
+                if speaker is not None:
+                    speaker_counts[speaker] = speaker_counts.get(speaker, 0) + 1
+
+                if self.dedup:
+                    ref, status, origin = self.entry_store.put(
+                        entry, [base_name, chunk_count + 1, len(current_chunk)]
+                    )
+                    unique_refs.add(tuple(ref))
+                    status_counts[status] += 1
+                    current_chunk.append(ref)
+                    current_status.append(status)
+                    current_origins.append(origin)
+                else:
+                    ref = None
+                    current_chunk.append(entry)
+                current_entries.append((entry, entry_size, ref))
                 current_size += entry_size
                 total_entries += 1
                 
             # Save the last chunk
             if current_chunk:
                 chunk_count += 1
-                self._save_chunk(current_chunk, chunk_count)
+                manifest.append(self._save_chunk(current_chunk, chunk_count, current_dates, carry_over,
+                                                 current_status, current_origins))
                 
         except json.JSONDecodeError as e:
             print(f"Error decoding JSON: {e}")
@@ -103,6 +397,9 @@ class DialogueChunker:
             # Fallback to streaming processing on memory error
             print("File too large for memory, using streaming approach...")
             return self._chunk_dialogue_streaming(input_file)
+        finally:
+            if self.entry_store is not None:
+                self.entry_store.close()
             
         stats = {
             "input_file": str(input_path),
@@ -110,12 +407,34 @@ class DialogueChunker:
             "total_characters": total_characters,
             "chunk_count": chunk_count,
             "average_chunk_size": total_characters / chunk_count if chunk_count > 0 else 0,
-            "output_directory": str(self.current_subdir)
+            "output_directory": str(self.current_subdir),
+            "invalid_dates": invalid_dates
         }
+        if invalid_dates:
+            print(f"Warning: {invalid_dates} entries have a non-ISO metadata.date and were left out of the date index")
+        if self.dedup:
+            stats.update({
+                "entry_store": str(self.entry_store_dir),
+                "unique_entries": len(unique_refs),
+                "new_entries": status_counts["new"],
+                "updated_entries": status_counts["updated"],
+                "duplicate_entries": status_counts["seen"],
+                "chunks_with_new_entries": [r["chunk_number"] for r in manifest if r["new_entries"]]
+            })
+            if status_counts["updated"]:
+                print(f"Warning: {status_counts['updated']} entries changed since they were first stored "
+                      f"(stored as new versions)")
         
         # Save statistics
         with open(self.current_subdir / "chunking_stats.json", 'w', encoding='utf-8') as f:
             json.dump(stats, f, ensure_ascii=False, indent=2)
+
+        # Save date manifest and per-entry date index
+        with open(self.current_subdir / MANIFEST_FILENAME, 'w', encoding='utf-8') as f:
+            json.dump({"chunks": manifest}, f, ensure_ascii=False, indent=2)
+        date_index.sort()
+        with open(self.current_subdir / DATE_INDEX_FILENAME, 'w', encoding='utf-8') as f:
+            json.dump({"entries": date_index}, f, ensure_ascii=False)
             
         return stats
     
@@ -125,25 +444,119 @@ class DialogueChunker:
         # (implement when large file support is needed)
         raise NotImplementedError("Streaming processing not yet implemented")
         
-    def _save_chunk(self, chunk_data: List[Dict[str, Any]], chunk_number: int):
-        """Save chunk to file"""
+    def _build_carry_over(self, previous_entries: List[Tuple[Dict[str, Any], int, Optional[List[int]]]],
+                          speaker_counts: Dict[str, int], entries_before: int,
+                          characters_before: int) -> Dict[str, Any]:
+        """
+        Build the carry-over block for the next chunk so it can be processed
+        without reading earlier chunks.
+
+        Trailing entries are taken whole, newest last, while they fit in
+        carry_over_size. When deduplicating they are carried as entry-store refs
+        ("trailing_entry_refs") instead of copies. If even the last entry does
+        not fit, the end of its text is carried as "trailing_excerpt" instead.
+
+        Args:
+            previous_entries: (entry, size, store ref) triples of the previous chunk
+            speaker_counts: Running entry count per speaker up to the previous chunk
+            entries_before: Number of entries in all previous chunks
+            characters_before: Number of characters in all previous chunks
+        """
+        trailing = []
+        budget = self.carry_over_size
+        for entry, size, ref in reversed(previous_entries):
+            if size > budget:
+                break
+            trailing.append(ref if self.dedup else entry)
+            budget -= size
+        trailing.reverse()
+
+        carry_over = {
+            "speakers": list(speaker_counts),
+            "speaker_counts": dict(speaker_counts),
+            "entries_before": entries_before,
+            "characters_before": characters_before,
+            "trailing_entry_refs" if self.dedup else "trailing_entries": trailing
+        }
+        if not trailing and previous_entries and self.carry_over_size > 0:
+            last = previous_entries[-1][0]
+            text = last.get("text") if isinstance(last, dict) else None
+            if not isinstance(text, str):
+                text = json.dumps(last, ensure_ascii=False)
+            carry_over["trailing_excerpt"] = {
+                "speaker": entry_speaker(last),
+                "text": text[-self.carry_over_size:]
+            }
+        return carry_over
+
+    def _save_chunk(self, chunk_data: List[Any], chunk_number: int,
+                    chunk_dates: List[Optional[str]], carry_over: Dict[str, Any],
+                    chunk_status: List[str], chunk_origins: List[Optional[List[Any]]]) -> Dict[str, Any]:
+        """
+        Save chunk to file (entries, or entry-store refs when deduplicating)
+
+        When deduplicating, chunk_metadata lists the positions of entries that
+        were new or changed in this export, and entry_origins gives the
+        [stem, chunk_number, position] each entry was first chunked at. The
+        manifest record lists the earlier chunks ("<stem>/chunk_NNN") whose
+        Emologs already cover this chunk's other entries.
+
+        Returns:
+            Manifest record for the chunk
+        """
         chunk_file = self.current_subdir / f"chunk_{chunk_number:03d}.json"
+        dates = [d for d in chunk_dates if d is not None]
+        date_min = min(dates) if dates else None
+        date_max = max(dates) if dates else None
         
         # Add chunk metadata
         chunk_with_metadata = {
             "chunk_metadata": {
                 "chunk_number": chunk_number,
                 "entry_count": len(chunk_data),
-                "session_id": f"E{chunk_number}"
-            },
-            "entries": chunk_data
+                "session_id": f"E{chunk_number}",
+                "date_min": date_min,
+                "date_max": date_max,
+                "carry_over": carry_over
+            }
         }
+        new_positions = [i for i, status in enumerate(chunk_status) if status == "new"]
+        updated_positions = [i for i, status in enumerate(chunk_status) if status == "updated"]
+        if self.dedup:
+            chunk_with_metadata["chunk_metadata"].update({
+                "entry_store": Path(os.path.relpath(self.entry_store_dir, self.current_subdir)).as_posix(),
+                "new_entry_positions": new_positions,
+                "updated_entry_positions": updated_positions,
+                "entry_origins": chunk_origins
+            })
+            chunk_with_metadata["entry_refs"] = chunk_data
+        else:
+            chunk_with_metadata["entries"] = chunk_data
         
         with open(chunk_file, 'w', encoding='utf-8') as f:
             json.dump(chunk_with_metadata, f, ensure_ascii=False, indent=2)
             
         print(f"Saved chunk {chunk_number}: {len(chunk_data)} entries")
 
+        record = {
+            "file": chunk_file.name,
+            "chunk_number": chunk_number,
+            "entry_count": len(chunk_data),
+            "date_min": date_min,
+            "date_max": date_max
+        }
+        if self.dedup:
+            record["new_entries"] = len(new_positions) + len(updated_positions)
+            record["earlier_chunks"] = sorted({
+                f"{origin[0]}/chunk_{origin[1]:03d}"
+                for status, origin in zip(chunk_status, chunk_origins)
+                if status == "seen" and origin is not None
+            })
+            record["unmapped_entries"] = sum(
+                1 for status, origin in zip(chunk_status, chunk_origins) if status == "seen" and origin is None
+            )
+        return record
+
 
 def main():
     parser = argparse.ArgumentParser(
@@ -164,13 +577,26 @@ def main():
         default="chunks",
         help="Output directory for chunk files (default: chunks)"
     )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Store entries once in <output-dir>/_entry_store and reference them from chunks"
+    )
+    parser.add_argument(
+        "--carry-over-size",
+        type=int,
+        default=2000,
+        help="Characters of trailing context from the previous chunk kept in each chunk (default: 2000)"
+    )
     
     args = parser.parse_args()
     
     # Initialize and run chunker
     chunker = DialogueChunker(
         chunk_size=args.chunk_size,
-        output_dir=args.output_dir
+        output_dir=args.output_dir,
+        dedup=args.dedup,
+        carry_over_size=args.carry_over_size
     )
     
     print(f"Chunking {args.input_file} into ~{args.chunk_size} character chunks...")
@@ -183,6 +609,10 @@ def main():
         print(f"Total characters: {stats['total_characters']:,}")
         print(f"Number of chunks: {stats['chunk_count']}")
         print(f"Average chunk size: {stats['average_chunk_size']:,.0f} characters")
+        if args.dedup:
+            print(f"New entries: {stats['new_entries']:,} "
+                  f"(updated: {stats['updated_entries']:,}, stored by earlier runs: {stats['duplicate_entries']:,})")
+            print(f"Chunks with new entries: {len(stats['chunks_with_new_entries'])}/{stats['chunk_count']}")
         print(f"Output directory: {stats['output_directory']}")
         
     except Exception as e:
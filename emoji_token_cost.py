@@ -0,0 +1,549 @@
+#!/usr/bin/env python3
+"""
+Emoji Token Cost Analyzer for Emolog
+Ranks dictionary/corpus emoji by total token spend and proposes cheaper single-codepoint alternatives
+
+Usage:
+    python emoji_token_cost.py <emolog_file> [<emolog_file> ...] [--define <define_file> ...]
+                               [--ranks-file <file.tiktoken> | --encoding <name>] [--top <n>] [--output-dir <directory>]
+    python emoji_token_cost.py <emolog_file> [<emolog_file> ...] --apply [--remap-file <remap.json>] [--output-dir <directory>]
+
+Example:
+    python emoji_token_cost.py emolog/*.txt --ranks-file cl100k_base.tiktoken --top 20
+    (review remapped/remap.json, set "confirmed": true on the mappings to keep)
+    python emoji_token_cost.py emolog/*.txt --apply --output-dir remapped/
+"""
+
+import argparse
+import importlib.util
+import json
+import base64
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import List, Dict, Any, Iterable, Optional, Set
+
+try:
+    import tiktoken  # Optional: used when no --ranks-file is given (encoding must be cached for offline use)
+except ImportError:
+    tiktoken = None
+
+
+ZWJ = "\u200d"
+VS15 = "\ufe0e"
+VS16 = "\ufe0f"
+KEYCAP = "\u20e3"
+
+# Code points that attach to the preceding emoji within one grapheme
+_EXTENDERS = {VS15, VS16, KEYCAP}
+_SKIN_TONES = range(0x1F3FB, 0x1F400)
+_TAGS = range(0xE0020, 0xE0080)
+_REGIONAL_INDICATORS = range(0x1F1E6, 0x1F200)
+
+# Approximation of the Unicode Emoji_Presentation property (renders as emoji without VS16)
+_EMOJI_PRESENTATION_RANGES = [
+    (0x1F300, 0x1F320), (0x1F32D, 0x1F335), (0x1F337, 0x1F37C), (0x1F37E, 0x1F393),
+    (0x1F3A0, 0x1F3CA), (0x1F3CF, 0x1F3D3), (0x1F3E0, 0x1F3F0), (0x1F3F8, 0x1F43E),
+    (0x1F440, 0x1F440), (0x1F442, 0x1F4FC), (0x1F4FF, 0x1F53D), (0x1F54B, 0x1F54E),
+    (0x1F550, 0x1F567), (0x1F5FB, 0x1F64F), (0x1F680, 0x1F6C5), (0x1F6CC, 0x1F6CC),
+    (0x1F6D0, 0x1F6D2), (0x1F6D5, 0x1F6D7), (0x1F6DC, 0x1F6DF), (0x1F6EB, 0x1F6EC),
+    (0x1F6F4, 0x1F6FC), (0x1F90C, 0x1F93A), (0x1F93C, 0x1F945), (0x1F947, 0x1F9FF),
+    (0x1FA70, 0x1FAFF),
+]
+
+# Arrows carry syntax (→-like connectors, directions); never remapped
+_ARROW_RANGES = [(0x2190, 0x21FF), (0x2794, 0x27BF), (0x2934, 0x2935), (0x2B05, 0x2B07)]
+
+DEFAULT_DEFINE_FILES = [
+    str(Path(__file__).parent / "Emolog_define.py"),
+    str(Path(__file__).parent / "Emolog_define_jp.py"),
+]
+
+# Hand-picked replacements that keep the meaning of common VS16 symbols
+PREFERRED_ALTERNATIVES = {
+    "🎞️": "🎬",  # now / present
+    "🗣️": "📢",  # AI narration
+    "👁️": "👀",  # subjective perspective
+    "❄️": "🧊",  # cold relationship
+    "🖼️": "🌄",  # objective / bird's-eye view
+}
+
+# Fallback pool of single-codepoint emoji with default emoji presentation.
+# Pool proposals carry no meaning and are only applied once confirmed in remap.json.
+CANDIDATE_POOL = [
+    "🌀", "🫧", "🪐", "🧭", "🪶", "🫀", "🧶", "🪴", "🌿", "🍃",
+    "🔮", "🪁", "🎐", "🏮", "🧿", "🪬", "🔔", "🎀", "🪅", "🧸",
+    "🛟", "🧲", "🔭", "🔬", "🪜", "🧮", "🪙", "🔑", "🎲", "📯",
+    "🎺", "🪘", "🪗", "🦋", "🐚", "🪸", "🌻", "🍀", "🌷", "🌙",
+]
+
+
+def split_graphemes(text: str) -> List[str]:
+    """
+    Split text into grapheme clusters (emoji-oriented subset of UAX #29).
+
+    Handles ZWJ sequences, variation selectors, skin tones, keycaps, tag
+    sequences and flag pairs. Joining the result reproduces the input.
+    """
+    graphemes = []
+    i = 0
+    n = len(text)
+    while i < n:
+        start = i
+        if ord(text[i]) in _REGIONAL_INDICATORS and i + 1 < n and ord(text[i + 1]) in _REGIONAL_INDICATORS:
+            i += 2
+            graphemes.append(text[start:i])
+            continue
+        i += 1
+        while i < n:
+            cp = ord(text[i])
+            if text[i] in _EXTENDERS or cp in _SKIN_TONES or cp in _TAGS:
+                i += 1
+            elif text[i] == ZWJ and i + 1 < n:
+                i += 2
+            else:
+                break
+        graphemes.append(text[start:i])
+    return graphemes
+
+
+def is_emoji(grapheme: str) -> bool:
+    """Whether a grapheme is an emoji symbol (as opposed to text or punctuation)"""
+    if VS16 in grapheme or ZWJ in grapheme or KEYCAP in grapheme:
+        return True
+    cp = ord(grapheme[0])
+    return (0x1F000 <= cp <= 0x1FAFF
+            or 0x2600 <= cp <= 0x27BF
+            or 0x2B00 <= cp <= 0x2BFF
+            or 0x2300 <= cp <= 0x23FF)
+
+
+def normalize_symbol(grapheme: str) -> str:
+    """Strip variation selectors so e.g. 🗝 and 🗝️ compare equal"""
+    return grapheme.replace(VS16, "").replace(VS15, "")
+
+
+def is_structural(grapheme: str) -> bool:
+    """Keycaps, flags, tag sequences and arrows: symbols whose form carries meaning"""
+    if KEYCAP in grapheme:
+        return True
+    if any(ord(c) in _REGIONAL_INDICATORS or ord(c) in _TAGS for c in grapheme):
+        return True
+    cp = ord(grapheme[0])
+    return any(lo <= cp <= hi for lo, hi in _ARROW_RANGES)
+
+
+def has_emoji_presentation(grapheme: str) -> bool:
+    """Whether a grapheme is a single code point that renders as emoji on its own"""
+    if len(grapheme) != 1:
+        return False
+    cp = ord(grapheme)
+    return any(lo <= cp <= hi for lo, hi in _EMOJI_PRESENTATION_RANGES)
+
+
+def load_bpe_ranks(ranks_file: str) -> Dict[bytes, int]:
+    """
+    Load BPE merge ranks in tiktoken format (one "<base64 token> <rank>" per line),
+    e.g. a local copy of cl100k_base.tiktoken.
+    """
+    path = Path(ranks_file)
+    if not path.exists():
+        raise FileNotFoundError(f"BPE ranks file not found: {ranks_file}")
+    ranks = {}
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                token, rank = line.split()
+                ranks[base64.b64decode(token)] = int(rank)
+    return ranks
+
+
+def bpe_token_count(data: bytes, ranks: Dict[bytes, int]) -> int:
+    """
+    Number of tokens byte-level BPE produces for one pre-tokenized piece:
+    repeatedly merge the adjacent pair with the lowest rank (as tiktoken does).
+    """
+    parts = [data[i:i + 1] for i in range(len(data))]
+    while len(parts) > 1:
+        best_rank = None
+        best_index = None
+        for i in range(len(parts) - 1):
+            rank = ranks.get(parts[i] + parts[i + 1])
+            if rank is not None and (best_rank is None or rank < best_rank):
+                best_rank = rank
+                best_index = i
+        if best_index is None:
+            break
+        parts[best_index:best_index + 2] = [parts[best_index] + parts[best_index + 1]]
+    return len(parts)
+
+
+class TokenCostModel:
+    def __init__(self, encoding_name: str = "cl100k_base", ranks_file: Optional[str] = None):
+        """
+        Args:
+            encoding_name: tiktoken encoding used when no ranks_file is given (default: cl100k_base)
+            ranks_file: Local BPE ranks file in tiktoken format; fully offline
+
+        Raises:
+            RuntimeError: Neither a ranks file nor a loadable tiktoken encoding is available.
+                          Costs are never estimated.
+        """
+        self.encoding_name = encoding_name
+        self.ranks_file = ranks_file
+        self.ranks = load_bpe_ranks(ranks_file) if ranks_file else None
+        self.encoding = None if self.ranks is not None else self._load_encoding(encoding_name)
+        self._cache: Dict[str, int] = {}  # Memoized per-grapheme costs
+
+    @staticmethod
+    def _load_encoding(encoding_name: str):
+        if tiktoken is None:
+            raise RuntimeError(
+                "No tokenizer available: pass --ranks-file <file.tiktoken> or install tiktoken"
+            )
+        try:
+            return tiktoken.get_encoding(encoding_name)
+        except Exception as e:
+            raise RuntimeError(
+                f"Could not load tiktoken encoding '{encoding_name}' ({e}); "
+                f"pass --ranks-file with a local copy of the ranks file"
+            )
+
+    @property
+    def source(self) -> str:
+        """Human-readable name of the cost source"""
+        return self.ranks_file if self.ranks is not None else f"tiktoken {self.encoding_name}"
+
+    def cost(self, grapheme: str) -> int:
+        """Token cost of a single grapheme"""
+        cached = self._cache.get(grapheme)
+        if cached is not None:
+            return cached
+        if self.ranks is not None:
+            value = bpe_token_count(grapheme.encode("utf-8"), self.ranks)
+        else:
+            value = len(self.encoding.encode(grapheme))
+        self._cache[grapheme] = value
+        return value
+
+
+def load_define_module(define_file: str):
+    """Import an Emolog definition file (e.g. Emolog_define.py) by path"""
+    path = Path(define_file)
+    if not path.exists():
+        raise FileNotFoundError(f"Definition file not found: {define_file}")
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _walk_strings(value: Any, location: str) -> Iterable:
+    """Yield (location, string) for every string nested in a dictionary table"""
+    if isinstance(value, str):
+        yield location, value
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            yield from _walk_strings(item, f"{location}.{key}")
+    elif isinstance(value, (list, tuple)):
+        for index, item in enumerate(value):
+            yield from _walk_strings(item, f"{location}[{index}]")
+
+
+def collect_dictionary_symbols(define_files: List[str]) -> Dict[str, List[str]]:
+    """
+    Collect emoji used in the upper-case dictionary tables of the definition modules.
+
+    Returns:
+        Mapping of emoji -> locations where it appears (e.g. "Emolog_define.TIME_MARKERS.now")
+    """
+    symbols: Dict[str, List[str]] = {}
+    for define_file in define_files:
+        module = load_define_module(define_file)
+        _collect_module_symbols(module, Path(define_file).stem, symbols)
+    return symbols
+
+
+def _collect_module_symbols(module, prefix: str, symbols: Dict[str, List[str]]):
+    for name, table in vars(module).items():
+        if not name.isupper() or not isinstance(table, dict):
+            continue
+        for location, text in _walk_strings(table, f"{prefix}.{name}"):
+            for grapheme in split_graphemes(text):
+                if is_emoji(grapheme):
+                    locations = symbols.setdefault(grapheme, [])
+                    if location not in locations:
+                        locations.append(location)
+
+
+def collect_taken_symbols(define_files: List[str], emolog_files: List[str]) -> Set[str]:
+    """
+    Every emoji appearing anywhere in the definition sources (comments and
+    examples included) or the corpus, normalized with normalize_symbol().
+    """
+    taken = set()
+    for path in [*define_files, *emolog_files]:
+        with open(path, 'r', encoding='utf-8') as f:
+            taken.update(normalize_symbol(g) for g in split_graphemes(f.read()) if is_emoji(g))
+    return taken
+
+
+def count_corpus_symbols(emolog_files: List[str]) -> Counter:
+    """Count emoji occurrences over a set of Emolog files"""
+    counts = Counter()
+    for emolog_file in emolog_files:
+        with open(emolog_file, 'r', encoding='utf-8') as f:
+            counts.update(g for g in split_graphemes(f.read()) if is_emoji(g))
+    return counts
+
+
+def rank_symbols(dictionary_symbols: Dict[str, List[str]], corpus_counts: Counter,
+                 model: TokenCostModel) -> List[Dict[str, Any]]:
+    """
+    Rank dictionary and corpus emoji by total token spend (cost x corpus count).
+
+    Forms that differ only in variation selectors (🗣️ / 🗣) share one row:
+    "symbol" is the dictionary form (else the most frequent corpus form),
+    "forms" holds the corpus count of each form and total_tokens sums their
+    spend. Dictionary symbols unused in the corpus are kept with a count of
+    zero so that expensive definitions still show up.
+    """
+    groups: Dict[str, Set[str]] = {}
+    for symbol in set(dictionary_symbols) | set(corpus_counts):
+        groups.setdefault(normalize_symbol(symbol), set()).add(symbol)
+
+    rows = []
+    for forms in groups.values():
+        defined = sorted(f for f in forms if f in dictionary_symbols)
+        symbol = defined[0] if defined else max(sorted(forms), key=lambda f: corpus_counts.get(f, 0))
+        form_counts = {f: corpus_counts[f] for f in sorted(forms) if corpus_counts.get(f, 0)}
+        rows.append({
+            "symbol": symbol,
+            "codepoints": len(symbol),
+            "cost": model.cost(symbol),
+            "count": sum(form_counts.values()),
+            "total_tokens": sum(model.cost(f) * c for f, c in form_counts.items()),
+            "forms": form_counts,
+            "locations": [location for f in defined for location in dictionary_symbols[f]]
+        })
+    rows.sort(key=lambda row: (-row["total_tokens"], -row["cost"], row["symbol"]))
+    return rows
+
+
+def propose_alternatives(ranked: List[Dict[str, Any]], model: TokenCostModel,
+                         taken: Set[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Propose a cheaper single-codepoint alternative for each multi-token symbol.
+
+    Keycaps, flags and arrows are skipped. PREFERRED_ALTERNATIVES keep the
+    meaning and are marked confirmed; CANDIDATE_POOL fallbacks are not and
+    must be confirmed in remap.json before --apply uses them. A candidate is
+    rejected if it already appears in taken (see collect_taken_symbols) or in
+    another proposal.
+
+    Returns:
+        Mapping of original symbol -> {replacement, source, confirmed, cost, replacement_cost}
+    """
+    taken = set(taken)
+    preferred = {normalize_symbol(symbol): alternative for symbol, alternative in PREFERRED_ALTERNATIVES.items()}
+    proposals = {}
+    for row in ranked:
+        symbol = row["symbol"]
+        if row["cost"] <= 1 or is_structural(symbol):
+            continue
+
+        candidates = []
+        if normalize_symbol(symbol) in preferred:
+            candidates.append((preferred[normalize_symbol(symbol)], "preferred"))
+        candidates.extend((candidate, "pool") for candidate in CANDIDATE_POOL)
+
+        for candidate, source in candidates:
+            if normalize_symbol(candidate) in taken or model.cost(candidate) >= row["cost"]:
+                continue
+            proposals[symbol] = {
+                "replacement": candidate,
+                "source": source,
+                "confirmed": source == "preferred",
+                "cost": row["cost"],
+                "replacement_cost": model.cost(candidate)
+            }
+            taken.add(normalize_symbol(candidate))
+            break
+    return proposals
+
+
+def load_confirmed_mapping(remap_file: str, taken: Set[str]) -> Dict[str, str]:
+    """
+    Read the confirmed entries of a (possibly hand-edited) remap.json.
+
+    Returns:
+        Mapping of normalize_symbol(original) -> replacement, so every
+        variation-selector form of a symbol is remapped
+
+    Raises:
+        ValueError: A replacement is not a single emoji, is already used in the
+                    definitions/corpus, or is assigned to two symbols
+    """
+    with open(remap_file, 'r', encoding='utf-8') as f:
+        proposals = json.load(f)
+
+    mapping = {}
+    used = set()
+    for symbol, proposal in proposals.items():
+        if not proposal.get("confirmed"):
+            continue
+        replacement = proposal["replacement"]
+        normalized = normalize_symbol(replacement)
+        if len(split_graphemes(replacement)) != 1 or not is_emoji(replacement):
+            raise ValueError(f"replacement for {symbol} is not a single emoji: {replacement}")
+        if normalized in taken or normalized in used:
+            raise ValueError(f"emoji collision: {replacement} (replacement for {symbol})")
+        used.add(normalized)
+        mapping[normalize_symbol(symbol)] = replacement
+    return mapping
+
+
+def remap_text(text: str, mapping: Dict[str, str]) -> str:
+    """
+    Replace whole graphemes only, so e.g. 👩 inside a family ZWJ sequence is never touched.
+    mapping is keyed by normalize_symbol(), so 🗣️ and 🗣 are both replaced.
+    """
+    return "".join(mapping.get(normalize_symbol(g), g) for g in split_graphemes(text))
+
+
+def apply_mapping(mapping: Dict[str, str], define_files: List[str], emolog_files: List[str],
+                  output_dir: str) -> Dict[str, Any]:
+    """
+    Write remapped definition files and rewritten Emolog files to output_dir.
+
+    Returns:
+        Summary of written files
+    """
+    out_path = Path(output_dir)
+    out_path.mkdir(parents=True, exist_ok=True)
+
+    remapped_defines = []
+    for define_file in define_files:
+        define_path = Path(define_file)
+        with open(define_path, 'r', encoding='utf-8') as f:
+            define_source = f.read()
+        target = out_path / define_path.name
+        with open(target, 'w', encoding='utf-8') as f:
+            f.write(remap_text(define_source, mapping))
+        remapped_defines.append(str(target))
+
+    emolog_dir = out_path / "emolog"
+    emolog_dir.mkdir(exist_ok=True)
+    rewritten = []
+    for emolog_file in emolog_files:
+        with open(emolog_file, 'r', encoding='utf-8') as f:
+            text = f.read()
+        target = emolog_dir / Path(emolog_file).name
+        with open(target, 'w', encoding='utf-8') as f:
+            f.write(remap_text(text, mapping))
+        rewritten.append(str(target))
+
+    return {
+        "define_files": remapped_defines,
+        "emolog_files": rewritten
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rank Emolog emoji by token spend and propose cheaper alternatives"
+    )
+    parser.add_argument(
+        "emolog_files",
+        nargs="+",
+        help="Emolog text files used to measure symbol frequency"
+    )
+    parser.add_argument(
+        "--define",
+        nargs="+",
+        default=DEFAULT_DEFINE_FILES,
+        help="Emolog definition files (default: Emolog_define.py Emolog_define_jp.py)"
+    )
+    parser.add_argument(
+        "--ranks-file",
+        help="Local BPE ranks file in tiktoken format (e.g. cl100k_base.tiktoken)"
+    )
+    parser.add_argument(
+        "--encoding",
+        default="cl100k_base",
+        help="tiktoken encoding name used without --ranks-file (default: cl100k_base)"
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=20,
+        help="Number of ranked symbols to print (default: 20)"
+    )
+    parser.add_argument(
+        "--apply",
+        action="store_true",
+        help="Apply the confirmed mappings in the remap file to the definitions and Emolog files"
+    )
+    parser.add_argument(
+        "--remap-file",
+        help="Proposal file to write / apply (default: <output-dir>/remap.json)"
+    )
+    parser.add_argument(
+        "--output-dir",
+        default="remapped",
+        help="Output directory (default: remapped)"
+    )
+
+    args = parser.parse_args()
+
+    remap_file = Path(args.remap_file or Path(args.output_dir) / "remap.json")
+
+    try:
+        taken = collect_taken_symbols(args.define, args.emolog_files)
+
+        if args.apply:
+            mapping = load_confirmed_mapping(str(remap_file), taken)
+            summary = apply_mapping(mapping, args.define, args.emolog_files, args.output_dir)
+            print(f"Applied {len(mapping)} confirmed mappings from {remap_file}")
+            print(f"Remapped definitions: {', '.join(summary['define_files'])}")
+            print(f"Rewritten Emolog files: {len(summary['emolog_files'])}")
+            return
+
+        model = TokenCostModel(args.encoding, args.ranks_file)
+        dictionary_symbols = collect_dictionary_symbols(args.define)
+        corpus_counts = count_corpus_symbols(args.emolog_files)
+        ranked = rank_symbols(dictionary_symbols, corpus_counts, model)
+        proposals = propose_alternatives(ranked, model, taken)
+
+        print(f"Token costs: {model.source}")
+        print(f"{'symbol':<8} {'cost':>5} {'count':>7} {'total':>8}  proposal")
+        for row in ranked[:args.top]:
+            proposal = proposals.get(row["symbol"])
+            note = ""
+            if proposal:
+                note = proposal["replacement"] + ("" if proposal["confirmed"] else "  (unconfirmed)")
+            print(f"{row['symbol']:<8} {row['cost']:>5} {row['count']:>7,} {row['total_tokens']:>8,}  {note}")
+
+        total = sum(row["total_tokens"] for row in ranked)
+        saved = sum(
+            row["total_tokens"] - row["count"] * proposals[row["symbol"]]["replacement_cost"]
+            for row in ranked if row["symbol"] in proposals
+        )
+        print(f"\nTotal emoji tokens: {total:,}")
+        print(f"Proposals: {len(proposals)} (savings if all applied: {saved:,} tokens)")
+
+        if remap_file.exists():
+            print(f"Remap file exists, not overwritten: {remap_file}")
+        else:
+            remap_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(remap_file, 'w', encoding='utf-8') as f:
+                json.dump(proposals, f, ensure_ascii=False, indent=2)
+            print(f"Proposals written to {remap_file}; set \"confirmed\": true to apply a mapping")
+
+    except Exception as e:
+        print(f"Error during analysis: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
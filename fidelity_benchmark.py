@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Round-Trip Fidelity Benchmark for Emolog
+Compares Emolog expansions against their source chunks and reports a size-versus-fidelity curve per dialogue
+
+Each chunk `chunks/<stem>/chunk_NNN.json` is paired with the Emolog files
+`<emolog-dir>/<stem>/chunk_NNN.emolog` and `chunk_NNN.*.emolog` (e.g. `chunk_001.r05.emolog`
+for several compression targets). The expansion of `X.emolog` is read from
+`<expansion-dir>/<stem>/X.txt`; when it is missing, a local dictionary-lookup stub is used.
+
+Usage:
+    python fidelity_benchmark.py <chunk_dir> [<chunk_dir> ...] [--emolog-dir <directory>] [--expansion-dir <directory>]
+                                 [--define <Emolog_define.py>] [--bin-width <ratio>] [--output <file>]
+
+Example:
+    python fidelity_benchmark.py chunks/sample01 --emolog-dir emolog/ --output fidelity_report.json
+"""
+
+import argparse
+import json
+import re
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Set
+
+from dialogue_chunker import entry_speaker, load_chunk_entries
+from emoji_token_cost import split_graphemes, is_emoji, load_define_module
+
+
+# Dialogue roles -> ENTITY_MAP labels
+ROLE_ENTITIES = {
+    "user": "USER",
+    "assistant": "AI",
+}
+
+# Words that name a role in an expansion (English and Japanese)
+ROLE_ALIASES = {
+    "user": ["user", "ユーザー", "利用者"],
+    "assistant": ["assistant", "ai", "アシスタント"],
+}
+
+# Words never treated as key concepts or entities
+STOPWORDS = {
+    "the", "and", "that", "this", "with", "have", "what", "your", "you're", "from", "they",
+    "would", "there", "their", "about", "which", "when", "will", "like", "just", "been",
+    "were", "them", "then", "than", "into", "some", "could", "also", "more", "very",
+    "here", "it's", "i'm", "don't", "let's", "does", "being", "over", "only", "other",
+}
+
+EVENT_ID_PATTERN = re.compile(r"\(id=([A-Za-z]+\d+)-(\d+)\)")
+# Event IDs as an expansion may cite them, with or without "(id=...)"
+EVENT_REF_PATTERN = re.compile(r"(?<![A-Za-z0-9])([A-Za-z]+\d+)-(\d+)(?![0-9])")
+NEW_ENTITY_PATTERN = re.compile(r"\[NEW:\s*([^=\]\s]+)\s*=\s*([^\]]+)\]")
+TAG_PATTERN = re.compile(r'"([^"]+)"')
+# Script-aware terms: Latin words, katakana runs and kanji runs (hiragana is mostly grammar)
+LATIN_WORD = r"[A-Za-z\u00C0-\u024F][A-Za-z\u00C0-\u024F'-]*"
+KATAKANA_RUN = r"[\u30A1-\u30FA\u30FC\u31F0-\u31FF]{2,}"
+KANJI_RUN = r"[\u3400-\u4DBF\u4E00-\u9FFF\u3005]{2,}"
+WORD_PATTERN = re.compile(LATIN_WORD)
+TERM_PATTERN = re.compile(f"{LATIN_WORD}|{KATAKANA_RUN}|{KANJI_RUN}")
+SENTENCE_START_PATTERN = re.compile(rf"(?:^|[.!?。！？]\s*)({LATIN_WORD})")
+# Japanese names are recognized by a following honorific or title (e.g. 田中さん, 佐藤部長)
+JP_NAME_PATTERN = re.compile(
+    r"([\u3400-\u4DBF\u4E00-\u9FFF\u3005]{1,4}|[\u30A1-\u30FA\u30FC]{2,})"
+    r"(?:さん|くん|君|ちゃん|様|さま|先生|部長|課長|社長)"
+)
+
+
+def _entry_text(entry: Any) -> str:
+    if isinstance(entry, dict) and isinstance(entry.get("text"), str):
+        return entry["text"]
+    return json.dumps(entry, ensure_ascii=False)
+
+
+def _words(text: str) -> Set[str]:
+    """Lower-cased Latin words"""
+    return {w.lower() for w in WORD_PATTERN.findall(text)}
+
+
+def _is_latin(term: str) -> bool:
+    return WORD_PATTERN.fullmatch(term) is not None
+
+
+def _found_terms(terms: Set[str], text: str) -> Set[str]:
+    """Terms present in text: Latin terms as whole words, Japanese terms as substrings"""
+    words = _words(text)
+    return {t for t in terms if (t in words if _is_latin(t) else t in text)}
+
+
+def profile_source(entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Extract reference features from a source chunk.
+
+    - speakers: metadata.role values
+    - tags:     terms appearing 2+ times (EMOLOG_TAGS include_if): Latin words of
+                4+ chars (not stopwords), katakana and kanji runs of 2+ chars
+    - entities: Latin capitalized words not at the start of a sentence, and
+                Japanese names followed by an honorific or title (JP_NAME_PATTERN)
+
+    These are lexical heuristics; Japanese text without honorifics yields no entities.
+    """
+    texts = [_entry_text(entry) for entry in entries]
+    text = "\n".join(texts)
+
+    counts = Counter(t if not _is_latin(t) else t.lower() for t in TERM_PATTERN.findall(text))
+    tags = {
+        t for t, c in counts.items()
+        if c >= 2 and (not _is_latin(t) or (len(t) >= 4 and t not in STOPWORDS))
+    }
+
+    sentence_starts = Counter(m.lower() for t in texts for m in SENTENCE_START_PATTERN.findall(t))
+    capitalized = Counter(w.lower() for w in WORD_PATTERN.findall(text) if w[0].isupper())
+    entities = {
+        w for w, c in capitalized.items()
+        if c > sentence_starts.get(w, 0) and w not in STOPWORDS and len(w) >= 2
+    }
+    entities.update(JP_NAME_PATTERN.findall(text))
+
+    return {
+        "characters": len(text),
+        "speakers": {s for s in (entry_speaker(e) for e in entries) if s is not None},
+        "tags": tags,
+        "entities": entities,
+    }
+
+
+def build_symbol_labels(define_module) -> Dict[str, str]:
+    """Reverse dictionary emoji -> label from the flat symbol tables of a definition module"""
+    labels = {}
+    for name, table in vars(define_module).items():
+        if not name.isupper() or not isinstance(table, dict):
+            continue
+        for label, symbol in table.items():
+            if isinstance(symbol, str) and symbol and all(is_emoji(g) for g in split_graphemes(symbol)):
+                labels.setdefault(symbol, label)
+    return labels
+
+
+def stub_expand(emolog_text: str, symbol_labels: Dict[str, str]) -> str:
+    """
+    Local stand-in for an AI expansion: replace each known emoji with its
+    dictionary label and keep tags, numbers and event IDs as they are.
+    """
+    labels = dict(symbol_labels)
+    for symbol, label in NEW_ENTITY_PATTERN.findall(emolog_text):
+        labels[symbol] = label.strip()
+    return "".join(
+        f" {labels[g]} " if g in labels else g
+        for g in split_graphemes(emolog_text)
+    )
+
+
+def _recall(expected: Set[str], found: Set[str]) -> Optional[float]:
+    """Share of expected items present in found; None when nothing is expected"""
+    if not expected:
+        return None
+    return len(expected & found) / len(expected)
+
+
+def score_pair(profile: Dict[str, Any], session_id: str, emolog_text: str, expansion_text: str,
+               entity_map: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Overlap metrics for one (source chunk, Emolog, expansion) triple.
+
+    speaker_coverage, tag_recall, entity_recall and event_id_coverage (share
+    of the Emolog's event IDs for this session cited in the expansion) score
+    the expansion text only, so they measure what survives the round trip.
+    emolog_speaker_presence, emolog_tag_presence and emolog_event_id_presence
+    (share of Emolog units linked to this session) report on the Emolog
+    itself and are not part of fidelity.
+
+    Returns:
+        size_ratio plus speaker_coverage, tag_recall, entity_recall,
+        event_id_coverage (None when not applicable), their mean as fidelity,
+        and the Emolog-side presence metrics
+    """
+    emolog_graphemes = set(split_graphemes(emolog_text))
+    emolog_tag_text = "\n".join(TAG_PATTERN.findall(emolog_text))
+
+    expansion_speakers = set()
+    emolog_speakers = set()
+    for speaker in profile["speakers"]:
+        label = ROLE_ENTITIES.get(speaker.lower(), speaker)
+        names = {speaker.lower(), label.lower(), *ROLE_ALIASES.get(speaker.lower(), [])}
+        if _found_terms(names, expansion_text):
+            expansion_speakers.add(speaker)
+        if entity_map.get(label) in emolog_graphemes:
+            emolog_speakers.add(speaker)
+
+    # Event IDs of this chunk's session, compared by number so E1-03 and E1-3 match
+    event_ids = {
+        (session, int(number)) for session, number in EVENT_ID_PATTERN.findall(emolog_text)
+        if session == session_id
+    }
+    expansion_ids = {(session, int(number)) for session, number in EVENT_REF_PATTERN.findall(expansion_text)}
+
+    # Emolog units (non-empty lines besides [NEW: ...]) linked to this chunk's session
+    units = [line for line in emolog_text.splitlines() if NEW_ENTITY_PATTERN.sub("", line).strip()]
+    linked = [
+        line for line in units
+        if any(session == session_id for session, _ in EVENT_ID_PATTERN.findall(line))
+    ]
+
+    metrics = {
+        "speaker_coverage": _recall(profile["speakers"], expansion_speakers),
+        "tag_recall": _recall(profile["tags"], _found_terms(profile["tags"], expansion_text)),
+        "entity_recall": _recall(profile["entities"], _found_terms(profile["entities"], expansion_text)),
+        "event_id_coverage": _recall(event_ids, expansion_ids),
+    }
+    values = [v for v in metrics.values() if v is not None]
+
+    return {
+        "size_ratio": len(emolog_text) / profile["characters"] if profile["characters"] else 0,
+        **metrics,
+        "fidelity": sum(values) / len(values) if values else 0,
+        "emolog_speaker_presence": _recall(profile["speakers"], emolog_speakers),
+        "emolog_tag_presence": _recall(profile["tags"], _found_terms(profile["tags"], emolog_tag_text)),
+        "emolog_event_id_presence": len(linked) / len(units) if units else None,
+    }
+
+
+def benchmark_dialogue(chunk_dir: str, emolog_dir: str, expansion_dir: Optional[str],
+                       define_module) -> List[Dict[str, Any]]:
+    """
+    Score every Emolog variant of every chunk in one chunk directory.
+
+    Returns:
+        Points sorted by size_ratio
+    """
+    chunk_path = Path(chunk_dir)
+    stem = chunk_path.name
+    symbol_labels = build_symbol_labels(define_module)
+    entity_map = getattr(define_module, "ENTITY_MAP", {})
+
+    points = []
+    for chunk_file in sorted(chunk_path.glob("chunk_*.json")):
+        emolog_stem_dir = Path(emolog_dir) / stem
+        variants = sorted(
+            [emolog_stem_dir / f"{chunk_file.stem}.emolog"] + list(emolog_stem_dir.glob(f"{chunk_file.stem}.*.emolog"))
+        )
+        variants = [v for v in variants if v.exists()]
+        if not variants:
+            continue
+
+        with open(chunk_file, 'r', encoding='utf-8') as f:
+            session_id = json.load(f)["chunk_metadata"]["session_id"]
+        profile = profile_source(load_chunk_entries(str(chunk_file)))
+
+        for emolog_file in variants:
+            with open(emolog_file, 'r', encoding='utf-8') as f:
+                emolog_text = f.read()
+
+            expansion_file = Path(expansion_dir) / stem / f"{emolog_file.stem}.txt" if expansion_dir else None
+            if expansion_file is not None and expansion_file.exists():
+                with open(expansion_file, 'r', encoding='utf-8') as f:
+                    expansion_text = f.read()
+                expansion_source = "file"
+            else:
+                expansion_text = stub_expand(emolog_text, symbol_labels)
+                expansion_source = "stub"
+
+            points.append({
+                "chunk": chunk_file.name,
+                "emolog": emolog_file.name,
+                "expansion": expansion_source,
+                **score_pair(profile, session_id, emolog_text, expansion_text, entity_map)
+            })
+
+    points.sort(key=lambda p: p["size_ratio"])
+    return points
+
+
+def fidelity_curve(points: List[Dict[str, Any]], bin_width: float = 0.05) -> List[Dict[str, Any]]:
+    """Mean fidelity per size_ratio bin"""
+    bins: Dict[int, List[float]] = {}
+    for point in points:
+        bins.setdefault(int(point["size_ratio"] / bin_width), []).append(point["fidelity"])
+    return [
+        {
+            "size_ratio_min": round(b * bin_width, 6),
+            "size_ratio_max": round((b + 1) * bin_width, 6),
+            "samples": len(values),
+            "mean_fidelity": sum(values) / len(values)
+        }
+        for b, values in sorted(bins.items())
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure Emolog round-trip fidelity against source chunks"
+    )
+    parser.add_argument(
+        "chunk_dirs",
+        nargs="+",
+        help="Chunk directories, one per dialogue (e.g. chunks/sample01)"
+    )
+    parser.add_argument(
+        "--emolog-dir",
+        default="emolog",
+        help="Directory containing <stem>/chunk_NNN*.emolog files (default: emolog)"
+    )
+    parser.add_argument(
+        "--expansion-dir",
+        help="Directory containing <stem>/<emolog name>.txt expansions (default: local stub)"
+    )
+    parser.add_argument(
+        "--define",
+        default="Emolog_define.py",
+        help="Emolog definition file used by the stub expander (default: Emolog_define.py)"
+    )
+    parser.add_argument(
+        "--bin-width",
+        type=float,
+        default=0.05,
+        help="Size-ratio bin width for the curve (default: 0.05)"
+    )
+    parser.add_argument(
+        "--output",
+        default="fidelity_report.json",
+        help="Report file (default: fidelity_report.json)"
+    )
+
+    args = parser.parse_args()
+
+    try:
+        define_module = load_define_module(args.define)
+        report = {}
+        for chunk_dir in args.chunk_dirs:
+            points = benchmark_dialogue(chunk_dir, args.emolog_dir, args.expansion_dir, define_module)
+            report[Path(chunk_dir).name] = {
+                "points": points,
+                "curve": fidelity_curve(points, args.bin_width)
+            }
+
+            print(f"\n{Path(chunk_dir).name}: {len(points)} Emolog files")
+            print(f"{'size ratio':>12} {'samples':>8} {'fidelity':>9}")
+            for row in report[Path(chunk_dir).name]["curve"]:
+                print(f"{row['size_ratio_min']:>5.2f}-{row['size_ratio_max']:<6.2f} "
+                      f"{row['samples']:>8} {row['mean_fidelity']:>9.3f}")
+
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nReport: {args.output}")
+
+    except Exception as e:
+        print(f"Error during benchmark: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()